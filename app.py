@@ -5,7 +5,7 @@ Lance avec: streamlit run app.py
 """
 
 import streamlit as st
-from chatbot_agent import ChatbotAgent
+from chatbot_agent import ChatbotAgent, DEFAULT_REQUEST_TIMEOUT, DEFAULT_MAX_TOKENS, NLP_PROFILES
 import time
 
 # Configuration de la page
@@ -21,6 +21,8 @@ if 'agent' not in st.session_state:
     st.session_state.messages = []
     st.session_state.show_analysis = False
     st.session_state.model_loaded = False
+    st.session_state.generating = False
+    st.session_state.partial_response = ""
 
 # Titre et description
 st.title("🤖 Chatbot IA avec NLP (Version Ollama - Gratuite)")
@@ -57,13 +59,42 @@ with st.sidebar:
         help="Plus haute = plus créatif, plus basse = plus précis"
     )
     
+    # Limites de génération
+    request_timeout = st.number_input(
+        "Délai maximal de réponse (s)",
+        min_value=10,
+        max_value=600,
+        value=DEFAULT_REQUEST_TIMEOUT,
+        step=10,
+        help="La réponse est interrompue au-delà de ce délai"
+    )
+    
+    max_tokens = st.number_input(
+        "Longueur maximale (tokens)",
+        min_value=32,
+        max_value=4096,
+        value=DEFAULT_MAX_TOKENS,
+        step=32,
+        help="Nombre maximal de tokens générés par réponse"
+    )
+    
+    # Profil NLP
+    nlp_profile = st.selectbox(
+        "Profil NLP",
+        options=list(NLP_PROFILES.keys()),
+        help="full: analyse complète | lite: moins de mémoire | rules-only: sans spaCy"
+    )
+    
     # Bouton de chargement du modèle
     if st.button("🚀 Charger le modèle", type="primary"):
         with st.spinner(f"Chargement de {selected_model}..."):
             try:
                 st.session_state.agent = ChatbotAgent(
                     model_name=selected_model,
-                    temperature=temperature
+                    temperature=temperature,
+                    request_timeout=int(request_timeout),
+                    max_tokens=int(max_tokens),
+                    nlp_profile=nlp_profile
                 )
                 st.session_state.model_loaded = True
                 st.session_state.messages = []
@@ -110,6 +141,7 @@ with st.sidebar:
         st.write(f"**Type:** {info['type']}")
         st.write(f"**Coût:** {info['cost']}")
         st.write(f"**Confidentialité:** {info['privacy']}")
+        st.write(f"**Profil NLP:** {info['nlp_profile']}")
         
         st.divider()
         
@@ -135,6 +167,18 @@ with st.sidebar:
                 st.subheader("Intentions")
                 intent_data = stats['intents']
                 st.bar_chart(intent_data)
+        
+        # Coût du profil NLP
+        st.subheader("Profil NLP")
+        report = st.session_state.agent.nlp_processor.get_profile_report()
+        col1, col2 = st.columns(2)
+        with col1:
+            # Coût propre du profil: mémoire ajoutée pendant son chargement
+            st.metric("Mémoire NLP", f"{report['nlp_rss_mb']} Mo" if report['nlp_rss_mb'] is not None else "n/d")
+        with col2:
+            st.metric("Latence NLP", f"{report['avg_latency_ms']} ms" if report['avg_latency_ms'] is not None else "n/d")
+        if report['rss_mb'] is not None:
+            st.caption(f"Processus complet (Streamlit, LangChain, toutes les sessions): {report['rss_mb']} Mo")
 
 # Zone principale
 if not st.session_state.model_loaded:
@@ -176,6 +220,18 @@ if not st.session_state.model_loaded:
     st.warning("⚠️ Assurez-vous qu'Ollama est installé et qu'un modèle est téléchargé")
 
 else:
+    # Une génération interrompue par le bouton d'arrêt (ou un nouveau message)
+    # n'a pas atteint la fin du script précédent: l'enregistrer comme annulée
+    if st.session_state.get('generating'):
+        st.session_state.agent.cancel()
+        st.session_state.generating = False
+        partial = st.session_state.partial_response
+        st.session_state.messages.append({
+            "role": "assistant",
+            "content": f"{partial}\n\n(Génération annulée)".strip(),
+            "status": "cancelled"
+        })
+    
     # Zone de chat
     chat_container = st.container()
     
@@ -185,6 +241,12 @@ else:
             with st.chat_message(message["role"]):
                 st.write(message["content"])
                 
+                # Signaler les réponses interrompues ou rejetées
+                if message.get("status") == 'rejected':
+                    st.warning("⏳ Serveur saturé, réessayez dans quelques instants")
+                elif message.get("status") == 'timeout':
+                    st.warning("⏱️ Réponse interrompue (délai dépassé)")
+                
                 # Afficher l'analyse si disponible
                 if st.session_state.show_analysis and "analysis" in message:
                     with st.expander("🔍 Analyse NLP"):
@@ -227,12 +289,26 @@ else:
         # Générer la réponse
         with st.chat_message("assistant"):
             with st.spinner("🤔 Réflexion en cours..."):
+                # Cliquer relance le script, ce qui interrompt et annule la génération
+                st.button("⏹️ Arrêter la réponse", key="stop_generation")
+                placeholder = st.empty()
+                
+                def show_partial(partial):
+                    # N'envoyer au navigateur que le texte nouveau
+                    if partial != st.session_state.partial_response:
+                        st.session_state.partial_response = partial
+                        placeholder.write(partial + " ▌")
+                
+                st.session_state.generating = True
+                st.session_state.partial_response = ""
                 result = st.session_state.agent.generate_response(
                     prompt,
-                    show_analysis=st.session_state.show_analysis
+                    show_analysis=st.session_state.show_analysis,
+                    on_progress=show_partial
                 )
+                st.session_state.generating = False
                 
-                st.write(result['response'])
+                placeholder.write(result['response'])
                 
                 # Afficher l'analyse
                 if st.session_state.show_analysis and 'analysis' in result:
@@ -265,7 +341,7 @@ else:
                                 st.write(f"- {entity['text']} ({entity['label']})")
         
         # Ajouter à l'historique
-        message_data = {"role": "assistant", "content": result['response']}
+        message_data = {"role": "assistant", "content": result['response'], "status": result['status']}
         if 'analysis' in result:
             message_data['analysis'] = result['analysis']
         st.session_state.messages.append(message_data)
@@ -19,12 +19,21 @@ Realisé par ABOU-EL KASEM KENZA - Novembre 2025
 """
 
 import os
+import json
+import time
+import argparse
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from langchain_community.llms import Ollama
 from langchain.memory import ConversationBufferMemory
 from langchain.chains import ConversationChain
 from langchain.prompts import PromptTemplate
 from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
-import spacy
+from langchain.callbacks.base import BaseCallbackHandler
+import requests
+from urllib3.exceptions import ReadTimeoutError
 from nltk.sentiment import SentimentIntensityAnalyzer
 import nltk
 
@@ -34,6 +43,51 @@ try:
 except:
     pass
 
+# Limites de génération par défaut
+DEFAULT_REQUEST_TIMEOUT = 120      # Délai maximal d'une réponse (secondes)
+DEFAULT_MAX_TOKENS = 512           # Nombre maximal de tokens générés (num_predict)
+MAX_CONCURRENT_GENERATIONS = 2     # Générations simultanées par serveur Ollama
+MAX_REPLAY_ATTEMPTS = 3            # Tentatives par conversation en mode batch
+DEFAULT_QUEUE_TIMEOUT = 10         # Attente maximale d'une place libre (secondes)
+GENERATION_POLL_INTERVAL = 0.1     # Fréquence de vérification du délai et de l'annulation
+
+# Profils NLP: compromis entre qualité d'analyse et mémoire/vitesse
+# - full: modèle complet avec vecteurs et tous les composants
+# - lite: petit modèle sans vecteurs, composants inutilisés exclus
+# - rules-only: aucun modèle spaCy, uniquement les règles et VADER
+NLP_PROFILES = {
+    'full': {
+        'models': ['fr_core_news_md', 'en_core_web_sm'],
+        'exclude': []
+    },
+    'lite': {
+        'models': ['fr_core_news_sm', 'fr_core_news_md', 'en_core_web_sm'],
+        # Seuls NER, lemmes et stop-words sont utilisés: l'analyse syntaxique est superflue
+        'exclude': ['parser', 'senter']
+    },
+    'rules-only': {
+        'models': [],
+        'exclude': []
+    }
+}
+
+
+def _current_rss_mb():
+    """Mémoire résidente du processus en Mo (None si indisponible)"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    
+    # Linux sans psutil
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
 # ============================================================================
 # 1. CLASSE NLP - Traitement du langage naturel
 # ============================================================================
@@ -41,27 +95,101 @@ except:
 class NLPProcessor:
     """Traite le texte avec analyse d'entités, sentiment et intentions"""
     
-    def __init__(self, language='fr'):
-        try:
-            self.nlp = spacy.load('fr_core_news_md')
-            print(" Modèle français chargé")
-        except:
-            print(" Modèle français non trouvé. Installation de l'anglais...")
-            try:
-                self.nlp = spacy.load('en_core_web_sm')
-            except:
+    def __init__(self, language='fr', profile='full', vector_rows=None):
+        """
+        Charge le pipeline NLP selon le profil choisi ('full', 'lite', 'rules-only')
+        
+        vector_rows: si précisé, réduit la table de vecteurs à ce nombre de lignes
+        (les mots retirés pointent vers leur voisin le plus proche). La table complète
+        est chargée avant d'être réduite: seule la mémoire en régime établi baisse,
+        pas le pic. Les vecteurs alimentent le tok2vec de fr_core_news_md, donc la
+        qualité de la NER peut baisser.
+        """
+        if profile not in NLP_PROFILES:
+            raise ValueError(f"Profil NLP inconnu: {profile} (choix: {', '.join(NLP_PROFILES)})")
+        
+        self.profile = profile
+        self.model_name = None
+        self.nlp = None
+        
+        rss_before = _current_rss_mb()
+        start = time.perf_counter()
+        
+        config = NLP_PROFILES[profile]
+        if config['models']:
+            # Import différé: le profil rules-only n'a pas besoin de charger spaCy
+            import spacy
+            
+            for model_name in config['models']:
+                try:
+                    self.nlp = spacy.load(model_name, exclude=config['exclude'])
+                    self.model_name = model_name
+                    print(f" Modèle {model_name} chargé (profil {profile})")
+                    break
+                except OSError:
+                    print(f" Modèle {model_name} non trouvé...")
+            
+            if self.nlp is None:
                 print(" Aucun modèle spaCy trouvé. Téléchargez avec:")
-                print("python -m spacy download fr_core_news_md")
-                self.nlp = None
+                print(f"python -m spacy download {config['models'][0]}")
+            elif vector_rows and self.nlp.vocab.vectors.shape[0] > vector_rows:
+                self.nlp.vocab.prune_vectors(vector_rows)
+                print(f" Vecteurs réduits à {vector_rows} lignes")
+        else:
+            print(" Profil rules-only: analyse sans spaCy")
         
         self.sia = SentimentIntensityAnalyzer()
         
-    def extract_entities(self, text):
+        # Coût du profil: temps de chargement, mémoire et latence par message
+        self.load_time = time.perf_counter() - start
+        rss_after = _current_rss_mb()
+        self.rss_load_mb = (rss_after - rss_before
+                            if rss_before is not None and rss_after is not None else None)
+        self.latency_stats = {'messages': 0, 'total_s': 0.0, 'max_s': 0.0}
+        self.last_latency = None
+    
+    def analyze(self, text):
+        """Analyse complète d'un message (le texte n'est parsé qu'une seule fois)"""
+        start = time.perf_counter()
+        doc = self.nlp(text) if self.nlp else None
+        
+        analysis = {
+            'entities': self.extract_entities(text, doc),
+            'sentiment': self.analyze_sentiment(text),
+            'intent': self.classify_intent(text),
+            'preprocessed': self.preprocess(text, doc)
+        }
+        
+        elapsed = time.perf_counter() - start
+        self.last_latency = elapsed
+        self.latency_stats['messages'] += 1
+        self.latency_stats['total_s'] += elapsed
+        self.latency_stats['max_s'] = max(self.latency_stats['max_s'], elapsed)
+        
+        return analysis
+    
+    def get_profile_report(self):
+        """Retourne le coût du profil NLP: mémoire, chargement et latence"""
+        messages = self.latency_stats['messages']
+        rss = _current_rss_mb()
+        return {
+            'profile': self.profile,
+            'model': self.model_name or 'aucun',
+            'load_s': round(self.load_time, 3),
+            'rss_mb': round(rss, 1) if rss is not None else None,
+            'nlp_rss_mb': round(self.rss_load_mb, 1) if self.rss_load_mb is not None else None,
+            'messages': messages,
+            'avg_latency_ms': round(self.latency_stats['total_s'] / messages * 1000, 2) if messages else None,
+            'max_latency_ms': round(self.latency_stats['max_s'] * 1000, 2) if messages else None
+        }
+        
+    def extract_entities(self, text, doc=None):
         """Extrait les entités nommées (personnes, lieux, organisations)"""
         if not self.nlp:
             return []
             
-        doc = self.nlp(text)
+        if doc is None:
+            doc = self.nlp(text)
         entities = []
         for ent in doc.ents:
             entities.append({
@@ -107,7 +235,7 @@ class NLPProcessor:
         else:
             return 'conversation'
     
-    def preprocess(self, text):
+    def preprocess(self, text, doc=None):
         """Nettoie et prépare le texte"""
         if not self.nlp:
             return {
@@ -116,7 +244,8 @@ class NLPProcessor:
                 'tokens': text.split()
             }
             
-        doc = self.nlp(text)
+        if doc is None:
+            doc = self.nlp(text)
         
         # Lemmatisation et nettoyage
         tokens = [token.lemma_.lower() for token in doc 
@@ -129,16 +258,88 @@ class NLPProcessor:
         }
 
 # ============================================================================
-# 2. CLASSE CHATBOT - Agent conversationnel avec Ollama
+# 2. CONTRÔLE DE LA GÉNÉRATION - Délais, annulation et admission
+# ============================================================================
+
+class GenerationCancelled(Exception):
+    """Génération interrompue (annulation ou délai dépassé)"""
+
+
+class GenerationGuard(BaseCallbackHandler):
+    """Collecte le flux de tokens et arrête la lecture une fois la génération annulée"""
+    
+    # Propager les exceptions au lieu de les ignorer dans le gestionnaire de callbacks
+    raise_error = True
+    
+    def __init__(self, cancel_event):
+        self.cancel_event = cancel_event
+        self.tokens = []
+    
+    def on_llm_new_token(self, token, **kwargs):
+        """Appelé à chaque token reçu d'Ollama (dans le thread de génération)"""
+        if self.cancel_event.is_set():
+            raise GenerationCancelled("Génération annulée")
+        self.tokens.append(token)
+    
+    def partial_response(self):
+        """Texte généré avant l'interruption"""
+        return ''.join(self.tokens).strip()
+
+
+def _is_read_timeout(error):
+    """Vrai si l'erreur vient d'un délai de lecture dépassé côté Ollama"""
+    if isinstance(error, requests.exceptions.Timeout):
+        return True
+    # Pendant le streaming, requests ré-emballe ReadTimeoutError dans une ConnectionError
+    return (isinstance(error, requests.exceptions.ConnectionError)
+            and any(isinstance(arg, ReadTimeoutError) for arg in error.args))
+
+
+# Places de génération partagées par tous les agents d'un même serveur Ollama,
+# au sein d'un processus (le mode batch partage un sémaphore entre processus)
+_backend_slots = {}
+_backend_slots_lock = threading.Lock()
+
+
+def _get_backend_slots(base_url, max_concurrent):
+    """Retourne le sémaphore d'admission associé à un serveur Ollama"""
+    with _backend_slots_lock:
+        if base_url not in _backend_slots:
+            _backend_slots[base_url] = (threading.BoundedSemaphore(max_concurrent), max_concurrent)
+        
+        slots, limit = _backend_slots[base_url]
+        if limit != max_concurrent:
+            raise ValueError(
+                f"{base_url} est déjà limité à {limit} générations simultanées "
+                f"(demandé: {max_concurrent})"
+            )
+        return slots
+
+# ============================================================================
+# 3. CLASSE CHATBOT - Agent conversationnel avec Ollama
 # ============================================================================
 
 class ChatbotAgent:
     """Agent conversationnel intelligent avec Ollama (modèle local gratuit)"""
     
-    def __init__(self, model_name="mistral", temperature=0.7, base_url="http://localhost:11434"):
+    def __init__(self, model_name="mistral", temperature=0.7, base_url="http://localhost:11434",
+                 request_timeout=DEFAULT_REQUEST_TIMEOUT, max_tokens=DEFAULT_MAX_TOKENS,
+                 max_concurrent=MAX_CONCURRENT_GENERATIONS, queue_timeout=DEFAULT_QUEUE_TIMEOUT,
+                 nlp_profile='full', nlp_vector_rows=None, backend_slots=None):
         """
         Initialise le chatbot avec Ollama
         
+        Limites de génération:
+        - request_timeout: délai maximal d'une réponse, en secondes
+        - max_tokens: nombre maximal de tokens générés par réponse
+        - max_concurrent: générations simultanées admises sur le serveur
+        - queue_timeout: attente maximale d'une place libre avant rejet (None: sans limite)
+        - backend_slots: sémaphore d'admission partagé entre processus (mode batch);
+          par défaut, un sémaphore par serveur Ollama dans le processus courant
+        
+        nlp_profile: 'full', 'lite' ou 'rules-only' (voir NLP_PROFILES)
+        nlp_vector_rows: taille maximale de la table de vecteurs spaCy
+        
         Modèles recommandés:
         - mistral: Équilibré, bon en français (7B)
         - llama2: Performant, anglais principalement (7B)
@@ -149,17 +350,28 @@ class ChatbotAgent:
         
         print(f" Initialisation du modèle {model_name}...")
         
+        # Contrôle de la génération
+        self.request_timeout = request_timeout
+        self.queue_timeout = queue_timeout
+        if backend_slots is None:
+            backend_slots = _get_backend_slots(base_url, max_concurrent)
+        self.backend_slots = backend_slots
+        self._cancel_event = threading.Event()
+        
         try:
             # Initialiser Ollama
             self.llm = Ollama(
                 model=model_name,
                 temperature=temperature,
                 base_url=base_url,
+                num_predict=max_tokens,
+                timeout=request_timeout,
                 # callbacks=[StreamingStdOutCallbackHandler()]  # Pour streaming en temps réel
             )
             
-            # Test rapide du modèle
-            test_response = self.llm.invoke("Bonjour")
+            # Test rapide du modèle (compte aussi dans les générations simultanées)
+            with self.backend_slots:
+                test_response = self.llm.invoke("Bonjour")
             print(f" Modèle {model_name} chargé et fonctionnel")
             
         except Exception as e:
@@ -178,7 +390,7 @@ class ChatbotAgent:
         )
         
         # Processeur NLP
-        self.nlp_processor = NLPProcessor()
+        self.nlp_processor = NLPProcessor(profile=nlp_profile, vector_rows=nlp_vector_rows)
         
         # Template de prompt optimisé pour modèles locaux
         template = """Tu es un assistant IA serviable, amical et concis. Tu réponds en français de manière naturelle.
@@ -210,15 +422,11 @@ Assistant:"""
         }
         
         self.model_name = model_name
+        
     
     def analyze_input(self, user_input):
         """Analyse complète du message utilisateur"""
-        analysis = {
-            'entities': self.nlp_processor.extract_entities(user_input),
-            'sentiment': self.nlp_processor.analyze_sentiment(user_input),
-            'intent': self.nlp_processor.classify_intent(user_input),
-            'preprocessed': self.nlp_processor.preprocess(user_input)
-        }
+        analysis = self.nlp_processor.analyze(user_input)
         
         # Mise à jour des statistiques
         self.stats['total_messages'] += 1
@@ -230,8 +438,25 @@ Assistant:"""
         
         return analysis
     
-    def generate_response(self, user_input, show_analysis=False):
-        """Génère une réponse avec analyse NLP optionnelle"""
+    def generate_response(self, user_input, show_analysis=False, on_progress=None):
+        """
+        Génère une réponse avec analyse NLP optionnelle
+        
+        La génération tourne dans un thread dédié: le délai maximal (compté à partir
+        de l'obtention d'une place) est tenu même si Ollama ne renvoie plus de tokens,
+        et cancel() l'interrompt. Une interruption de l'appelant (Ctrl-C, arrêt
+        Streamlit) annule aussi la génération. Une réponse interrompue n'est pas
+        conservée dans la mémoire de conversation.
+        
+        on_progress: appelé régulièrement avec le texte partiel, depuis le thread appelant
+        
+        Le résultat contient un champ 'status': 'ok', 'timeout', 'cancelled',
+        'rejected' (serveur saturé) ou 'error'.
+        """
+        # Nouvel événement par requête: une annulation ne vise que la génération en cours
+        cancel_event = threading.Event()
+        self._cancel_event = cancel_event
+        
         # Analyser l'entrée
         analysis = self.analyze_input(user_input)
         
@@ -250,23 +475,105 @@ Assistant:"""
         if context_hint:
             enriched_input = f"{context_hint}\n{user_input}"
         
+        # Contrôle d'admission: attendre une place libre (sans limite si queue_timeout
+        # vaut None), sinon rejeter. Cette attente ne compte pas dans le délai de réponse.
+        if not self.backend_slots.acquire(timeout=self.queue_timeout):
+            result = {
+                'response': "Le serveur est saturé, veuillez réessayer dans quelques instants.",
+                'status': 'rejected'
+            }
+            if show_analysis:
+                result['analysis'] = analysis
+            return result
+        
+        deadline = time.monotonic() + self.request_timeout
+        guard = GenerationGuard(cancel_event)
+        outcome = {}
+        # Arbitre entre la fin de la génération et son abandon par l'appelant
+        outcome_lock = threading.Lock()
+        
+        def _predict():
+            try:
+                response = self.conversation.predict(input=enriched_input, callbacks=[guard])
+                with outcome_lock:
+                    if outcome.get('abandoned'):
+                        # L'appelant a déjà renoncé: ne pas garder une réponse jamais affichée
+                        self._forget_last_exchange()
+                    else:
+                        outcome['response'] = response
+            except Exception as e:
+                outcome['error'] = e
+            finally:
+                # La place n'est libérée que lorsque la requête Ollama est réellement terminée
+                self.backend_slots.release()
+        
+        def _abandon():
+            """Abandonne la génération; faux si elle s'est terminée entre-temps"""
+            with outcome_lock:
+                if 'response' in outcome:
+                    return False
+                outcome['abandoned'] = True
+                cancel_event.set()
+                return True
+        
+        worker = threading.Thread(target=_predict, daemon=True)
+        worker.start()
+        
+        status = 'ok'
         try:
-            # Générer la réponse
-            response = self.conversation.predict(input=enriched_input)
-            
+            while True:
+                worker.join(GENERATION_POLL_INTERVAL)
+                if not worker.is_alive():
+                    break
+                if on_progress:
+                    on_progress(guard.partial_response())
+                if cancel_event.is_set():
+                    if _abandon():
+                        status = 'cancelled'
+                    break
+                if time.monotonic() > deadline:
+                    # Le thread de génération s'arrête au prochain token ou au délai HTTP
+                    if _abandon():
+                        status = 'timeout'
+                    break
+        except BaseException:
+            if not _abandon():
+                # Réponse complète mais jamais transmise à l'appelant
+                self._forget_last_exchange()
+            raise
+        
+        error = outcome.get('error')
+        if status == 'ok' and isinstance(error, GenerationCancelled):
+            status = 'cancelled'
+        elif status == 'ok' and error is not None and _is_read_timeout(error):
+            status = 'timeout'
+        
+        if status == 'timeout':
+            response = f"{guard.partial_response()}\n\n(Réponse interrompue: délai de {self.request_timeout}s dépassé)".strip()
+        elif status == 'cancelled':
+            response = f"{guard.partial_response()}\n\n(Génération annulée)".strip()
+        elif error is not None:
+            status = 'error'
+            response = f"Désolé, j'ai rencontré une erreur: {str(error)}"
+        else:
             # Nettoyer la réponse (enlever les répétitions parfois générées par les modèles locaux)
-            response = response.strip()
-            
-        except Exception as e:
-            response = f"Désolé, j'ai rencontré une erreur: {str(e)}"
+            response = outcome['response'].strip()
         
-        result = {'response': response}
+        result = {'response': response, 'status': status}
         
         if show_analysis:
             result['analysis'] = analysis
         
         return result
     
+    def cancel(self):
+        """Annule la génération en cours (appelable depuis un autre thread)"""
+        self._cancel_event.set()
+    
+    def _forget_last_exchange(self):
+        """Retire le dernier échange (utilisateur + assistant) de la mémoire"""
+        del self.memory.chat_memory.messages[-2:]
+    
     def get_stats(self):
         """Retourne les statistiques de conversation"""
         return self.stats
@@ -286,14 +593,26 @@ Assistant:"""
             'model': self.model_name,
             'type': 'Ollama (Local)',
             'cost': 'Gratuit',
-            'privacy': '100% Local'
+            'privacy': '100% Local',
+            'nlp_profile': self.nlp_processor.profile
         }
 
 # ============================================================================
-# 3. INTERFACE LIGNE DE COMMANDE
+# 4. INTERFACE LIGNE DE COMMANDE
 # ============================================================================
 
-def run_cli_chatbot():
+def _print_ollama_help(model_name):
+    """Affiche les étapes d'installation quand Ollama est injoignable"""
+    print(f"\n Impossible de démarrer le chatbot.")
+    print("\n Installation rapide:")
+    print("1. Installez Ollama: https://ollama.com")
+    print(f"2. Téléchargez le modèle: ollama pull {model_name}")
+    print("3. Relancez ce script")
+
+
+def run_cli_chatbot(request_timeout=DEFAULT_REQUEST_TIMEOUT, max_tokens=DEFAULT_MAX_TOKENS,
+                    nlp_profile='full', nlp_vector_rows=None,
+                    max_concurrent=MAX_CONCURRENT_GENERATIONS, queue_timeout=DEFAULT_QUEUE_TIMEOUT):
     """Lance le chatbot en mode console"""
     print("=" * 60)
     print(" CHATBOT IA AVEC NLP (Version Ollama - Gratuite)")
@@ -304,7 +623,9 @@ def run_cli_chatbot():
     print("  /clear    - Effacer la mémoire")
     print("  /model    - Changer de modèle")
     print("  /info     - Informations sur le modèle")
-    print("  /quit     - Quitter\n")
+    print("  /nlp      - Coût du profil NLP (mémoire, latence)")
+    print("  /quit     - Quitter")
+    print("  Ctrl-C pendant la réflexion interrompt la réponse en cours\n")
     
     # Demander quel modèle utiliser
     print(" Modèles Ollama disponibles:")
@@ -327,13 +648,17 @@ def run_cli_chatbot():
     
     # Créer l'agent
     try:
-        agent = ChatbotAgent(model_name=model_name)
+        agent = ChatbotAgent(
+            model_name=model_name,
+            request_timeout=request_timeout,
+            max_tokens=max_tokens,
+            nlp_profile=nlp_profile,
+            nlp_vector_rows=nlp_vector_rows,
+            max_concurrent=max_concurrent,
+            queue_timeout=queue_timeout
+        )
     except Exception as e:
-        print(f"\n Impossible de démarrer le chatbot.")
-        print("\n Installation rapide:")
-        print("1. Installez Ollama: https://ollama.com")
-        print(f"2. Téléchargez le modèle: ollama pull {model_name}")
-        print("3. Relancez ce script")
+        _print_ollama_help(model_name)
         return
     
     show_analysis = False
@@ -378,7 +703,17 @@ def run_cli_chatbot():
                     print(f"  Modèle: {info['model']}")
                     print(f"  Type: {info['type']}")
                     print(f"  Coût: {info['cost']}")
-                    print(f"  Confidentialité: {info['privacy']}\n")
+                    print(f"  Confidentialité: {info['privacy']}")
+                    print(f"  Profil NLP: {info['nlp_profile']}\n")
+                    continue
+                    
+                elif user_input == '/nlp':
+                    report = agent.nlp_processor.get_profile_report()
+                    print(f"\n Profil NLP:")
+                    print(f"  Profil: {report['profile']} ({report['model']})")
+                    print(f"  Chargement: {report['load_s']}s")
+                    print(f"  Mémoire (RSS): {report['rss_mb']} Mo, dont NLP: {report['nlp_rss_mb']} Mo")
+                    print(f"  Latence par message: {report['avg_latency_ms']} ms (max {report['max_latency_ms']} ms)\n")
                     continue
                     
                 elif user_input == '/model':
@@ -388,7 +723,12 @@ def run_cli_chatbot():
             
             # Générer la réponse
             print("\nRéflexion...", end="\r")
-            result = agent.generate_response(user_input, show_analysis)
+            try:
+                result = agent.generate_response(user_input, show_analysis)
+            except KeyboardInterrupt:
+                # Ctrl-C annule la génération en cours, pas la session
+                print("\n Réponse interrompue\n")
+                continue
             print(" " * 20, end="\r")  # Effacer le message
             
             # Afficher l'analyse si activée
@@ -410,11 +750,360 @@ def run_cli_chatbot():
             print(f"\n Erreur: {e}\n")
 
 # ============================================================================
-# 4. POINT D'ENTRÉE
+# 5. MODE BATCH - Rejeu de conversations enregistrées
+# ============================================================================
+
+# Agent propre à chaque processus worker (modèles NLP chargés une seule fois)
+_worker_agent = None
+
+
+def _init_batch_worker(model_name, temperature, base_url, request_timeout, max_tokens,
+                       nlp_profile, nlp_vector_rows, backend_slots, queue_timeout):
+    """Initialise l'agent une seule fois par processus worker"""
+    global _worker_agent
+    _worker_agent = ChatbotAgent(
+        model_name=model_name,
+        temperature=temperature,
+        base_url=base_url,
+        request_timeout=request_timeout,
+        max_tokens=max_tokens,
+        nlp_profile=nlp_profile,
+        nlp_vector_rows=nlp_vector_rows,
+        backend_slots=backend_slots,
+        queue_timeout=queue_timeout
+    )
+
+
+def _replay_conversation(conversation):
+    """Rejoue une conversation complète, tour par tour, dans le worker courant"""
+    agent = _worker_agent
+    # Chaque conversation repart d'une mémoire vide
+    agent.clear_memory()
+    
+    turns = []
+    start = time.perf_counter()
+    for user_input in conversation['messages']:
+        turn_start = time.perf_counter()
+        result = agent.generate_response(user_input, show_analysis=True)
+        turns.append({
+            'input': user_input,
+            'response': result['response'],
+            'status': result['status'],
+            'intent': result['analysis']['intent'],
+            'sentiment': result['analysis']['sentiment']['sentiment'],
+            'nlp_latency_ms': round(agent.nlp_processor.last_latency * 1000, 2),
+            'latency_s': round(time.perf_counter() - turn_start, 4)
+        })
+        
+        # Un tour en échec rend la suite de la conversation non représentative:
+        # on s'arrête et la conversation sera rejouée à la reprise
+        if result['status'] != 'ok':
+            break
+    
+    # Latences NLP de cette conversation uniquement; mémoire et chargement
+    # concernent le worker entier et sont rapportés comme tels
+    nlp_latencies = [turn['nlp_latency_ms'] for turn in turns]
+    report = agent.nlp_processor.get_profile_report()
+    
+    record = {
+        'conversation_id': conversation['conversation_id'],
+        'attempt': conversation['attempt'],
+        'turns': turns,
+        'stats': agent.get_stats(),
+        'nlp': {
+            'profile': report['profile'],
+            'model': report['model'],
+            'messages': len(nlp_latencies),
+            'avg_latency_ms': round(sum(nlp_latencies) / len(nlp_latencies), 2) if nlp_latencies else None,
+            'max_latency_ms': max(nlp_latencies) if nlp_latencies else None
+        },
+        'total_s': round(time.perf_counter() - start, 4),
+        'worker_pid': os.getpid(),
+        'worker_rss_mb': report['rss_mb']
+    }
+    
+    if turns and turns[-1]['status'] != 'ok':
+        record['error'] = f"tour {len(turns)}: {turns[-1]['status']} - {turns[-1]['response']}"
+    
+    return record
+
+
+def _parse_conversation(line, line_number):
+    """Convertit une ligne JSONL en conversation (ValueError si mal formée)"""
+    record = json.loads(line)
+    if not isinstance(record, dict) or not isinstance(record.get('messages'), list):
+        raise ValueError("champ 'messages' manquant ou invalide")
+    
+    # Les messages sont des chaînes, ou des dicts {"role": ..., "content": ...}
+    # comme dans l'historique de l'application: seuls les tours utilisateur sont rejoués
+    messages = []
+    for message in record['messages']:
+        if isinstance(message, str):
+            messages.append(message)
+        elif isinstance(message, dict) and 'role' in message and isinstance(message.get('content'), str):
+            if message['role'] == 'user':
+                messages.append(message['content'])
+        else:
+            raise ValueError(f"message invalide (role et content texte requis): {message!r}")
+    
+    return {
+        'conversation_id': str(record.get('conversation_id', line_number)),
+        'messages': messages
+    }
+
+
+def _read_conversations(input_path, skip_ids, failed_attempts):
+    """Lit les conversations JSONL en flux, en ignorant celles à ne pas rejouer"""
+    with open(input_path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            
+            try:
+                conversation = _parse_conversation(line, line_number)
+            except ValueError as e:
+                print(f"\n Ligne {line_number} ignorée: {e}")
+                continue
+            
+            conversation_id = conversation['conversation_id']
+            if conversation_id in skip_ids:
+                continue
+            
+            conversation['attempt'] = failed_attempts.get(conversation_id, 0) + 1
+            yield conversation
+
+
+def _load_replay_progress(output_path):
+    """
+    Retrouve l'avancement d'un rejeu précédent pour reprendre après un crash
+    
+    Retourne les conversations terminées et, pour les autres, le nombre de
+    tentatives en échec déjà enregistrées.
+    """
+    done_ids = set()
+    failed_attempts = {}
+    if not os.path.exists(output_path):
+        return done_ids, failed_attempts
+    
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Dernière ligne tronquée par un crash
+                continue
+            conversation_id = record['conversation_id']
+            if 'error' in record:
+                failed_attempts[conversation_id] = failed_attempts.get(conversation_id, 0) + 1
+            else:
+                done_ids.add(conversation_id)
+    
+    for conversation_id in done_ids:
+        failed_attempts.pop(conversation_id, None)
+    return done_ids, failed_attempts
+
+
+def _ensure_trailing_newline(output_path):
+    """Termine une ligne tronquée pour que le prochain résultat ne s'y colle pas"""
+    if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        return
+    
+    with open(output_path, 'rb+') as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b'\n':
+            f.write(b'\n')
+
+
+def run_batch_replay(input_path, output_path, model_name="mistral", temperature=0.7,
+                     base_url="http://localhost:11434", workers=None,
+                     request_timeout=DEFAULT_REQUEST_TIMEOUT, max_tokens=DEFAULT_MAX_TOKENS,
+                     nlp_profile='full', nlp_vector_rows=None,
+                     max_concurrent=MAX_CONCURRENT_GENERATIONS, queue_timeout=None,
+                     max_attempts=MAX_REPLAY_ATTEMPTS):
+    """
+    Rejoue des conversations JSONL à travers le pipeline complet de ChatbotAgent
+    
+    Format d'entrée (une conversation par ligne):
+        {"conversation_id": "abc", "messages": ["Bonjour", "Quelle heure est-il ?"]}
+    
+    Les conversations sont réparties sur un pool de processus; les tours d'une
+    même conversation restent ordonnés dans un seul worker. Chaque résultat est
+    écrit dès qu'il est prêt, et un second lancement reprend là où le premier
+    s'est arrêté.
+    
+    Tous les workers partagent un même sémaphore d'admission: au plus
+    max_concurrent générations atteignent Ollama en même temps. Par défaut, un
+    tour attend une place libre sans limite (queue_timeout=None) et il y a
+    autant de workers que de places.
+    
+    Une conversation en échec est rejouée à la reprise, avec un champ 'attempt'
+    incrémenté: pour chaque conversation_id, le dernier enregistrement fait foi.
+    Après max_attempts échecs, elle est abandonnée et signalée.
+    """
+    workers = workers or max_concurrent
+    if workers > max_concurrent:
+        print(f" Attention: {workers} workers pour {max_concurrent} générations simultanées, "
+              f"les workers en surplus attendront une place libre")
+    done_ids, failed_attempts = _load_replay_progress(output_path)
+    _ensure_trailing_newline(output_path)
+    
+    # Conversations qui échouent à chaque reprise: ne plus les rejouer
+    given_up = sorted(conversation_id for conversation_id, attempts in failed_attempts.items()
+                      if attempts >= max_attempts)
+    conversations = _read_conversations(input_path, done_ids | set(given_up), failed_attempts)
+    
+    if done_ids or failed_attempts:
+        print(f" Reprise: {len(done_ids)} conversations déjà traitées, "
+              f"{len(failed_attempts) - len(given_up)} à retenter")
+    if given_up:
+        print(f" {len(given_up)} conversations abandonnées après {max_attempts} échecs: "
+              f"{', '.join(given_up[:10])}{'...' if len(given_up) > 10 else ''}")
+    print(f" Rejeu de {input_path} avec {workers} workers ({model_name})...")
+    
+    # Nombre maximal de conversations en vol pour ne pas charger tout le fichier
+    max_pending = workers * 2
+    processed = 0
+    failed = 0
+    start = time.perf_counter()
+    
+    with multiprocessing.Manager() as manager, \
+            open(output_path, 'a', encoding='utf-8') as out, \
+            ProcessPoolExecutor(max_workers=workers,
+                                initializer=_init_batch_worker,
+                                initargs=(model_name, temperature, base_url,
+                                          request_timeout, max_tokens,
+                                          nlp_profile, nlp_vector_rows,
+                                          manager.BoundedSemaphore(max_concurrent),
+                                          queue_timeout)) as pool:
+        pending = {}
+        exhausted = False
+        broken = False
+        
+        while (pending or not exhausted) and not broken:
+            # Remplir la fenêtre de conversations en cours
+            while not exhausted and len(pending) < max_pending:
+                conversation = next(conversations, None)
+                if conversation is None:
+                    exhausted = True
+                    break
+                try:
+                    future = pool.submit(_replay_conversation, conversation)
+                except BrokenProcessPool:
+                    broken = True
+                    break
+                pending[future] = conversation
+            
+            if not pending:
+                break
+            
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                conversation = pending.pop(future)
+                try:
+                    record = future.result()
+                except BrokenProcessPool:
+                    # Workers morts (souvent Ollama injoignable): rien à enregistrer,
+                    # la conversation sera rejouée à la reprise
+                    broken = True
+                    continue
+                except Exception as e:
+                    record = {
+                        'conversation_id': conversation['conversation_id'],
+                        'attempt': conversation['attempt'],
+                        'error': str(e)
+                    }
+                
+                if 'error' in record:
+                    failed += 1
+                else:
+                    processed += 1
+                
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+            
+            print(f" {processed} conversations traitées, {failed} en erreur", end="\r")
+    
+    elapsed = time.perf_counter() - start
+    
+    if broken:
+        print(f"\n Pool de workers interrompu après {processed} conversations.")
+        _print_ollama_help(model_name)
+        return {'processed': processed, 'failed': failed, 'given_up': len(given_up),
+                'elapsed_s': elapsed, 'aborted': True}
+    
+    print(f"\n Terminé en {elapsed:.1f}s - résultats dans {output_path}")
+    if failed:
+        print(f" {failed} conversations en échec: relancez pour les retenter "
+              f"(abandon après {max_attempts} tentatives)")
+    if given_up:
+        print(f" {len(given_up)} conversations abandonnées non rejouées")
+    
+    return {'processed': processed, 'failed': failed, 'given_up': len(given_up),
+            'elapsed_s': elapsed}
+
+# ============================================================================
+# 6. POINT D'ENTRÉE
 # ============================================================================
 
 if __name__ == "__main__":
-    print("\n Bienvenue ! Ce chatbot utilise Ollama (100% gratuit et local)")
-    print("Aucune clé API nécessaire - Vos données restent privées\n")
+    parser = argparse.ArgumentParser(description="Chatbot IA avec NLP (Ollama)")
+    parser.add_argument('--batch', metavar='INPUT',
+                        help="Fichier JSONL de conversations à rejouer (mode non interactif)")
+    parser.add_argument('--output', default='replay_results.jsonl',
+                        help="Fichier JSONL de résultats (reprise automatique)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Nombre de processus workers (défaut: --max-concurrent)")
+    parser.add_argument('--model', default='mistral', help="Modèle Ollama à utiliser")
+    parser.add_argument('--temperature', type=float, default=0.7)
+    parser.add_argument('--base-url', default='http://localhost:11434')
+    parser.add_argument('--timeout', type=int, default=DEFAULT_REQUEST_TIMEOUT,
+                        help="Délai maximal d'une réponse, en secondes")
+    parser.add_argument('--max-tokens', type=int, default=DEFAULT_MAX_TOKENS,
+                        help="Nombre maximal de tokens générés par réponse")
+    parser.add_argument('--max-attempts', type=int, default=MAX_REPLAY_ATTEMPTS,
+                        help="Tentatives par conversation avant abandon (mode batch)")
+    parser.add_argument('--max-concurrent', type=int, default=MAX_CONCURRENT_GENERATIONS,
+                        help="Générations simultanées admises sur le serveur Ollama")
+    parser.add_argument('--queue-timeout', type=int, default=None,
+                        help="Attente maximale d'une place libre avant rejet, en secondes "
+                             f"(défaut: {DEFAULT_QUEUE_TIMEOUT}s en console, sans limite en batch)")
+    parser.add_argument('--nlp-profile', choices=list(NLP_PROFILES), default='full',
+                        help="Profil NLP: qualité d'analyse contre mémoire et vitesse")
+    parser.add_argument('--nlp-vector-rows', type=int, default=None,
+                        help="Réduit la table de vecteurs spaCy à ce nombre de lignes. La table "
+                             "complète est chargée avant réduction (pic mémoire inchangé) et, "
+                             "avec fr_core_news_md, la qualité NER peut baisser")
+    args = parser.parse_args()
     
-    run_cli_chatbot()
\ No newline at end of file
+    if args.batch:
+        run_batch_replay(
+            args.batch,
+            args.output,
+            model_name=args.model,
+            temperature=args.temperature,
+            base_url=args.base_url,
+            workers=args.workers,
+            request_timeout=args.timeout,
+            max_tokens=args.max_tokens,
+            nlp_profile=args.nlp_profile,
+            nlp_vector_rows=args.nlp_vector_rows,
+            max_concurrent=args.max_concurrent,
+            queue_timeout=args.queue_timeout,
+            max_attempts=args.max_attempts
+        )
+    else:
+        print("\n Bienvenue ! Ce chatbot utilise Ollama (100% gratuit et local)")
+        print("Aucune clé API nécessaire - Vos données restent privées\n")
+        
+        if args.queue_timeout is None:
+            args.queue_timeout = DEFAULT_QUEUE_TIMEOUT
+        
+        run_cli_chatbot(
+            request_timeout=args.timeout,
+            max_tokens=args.max_tokens,
+            nlp_profile=args.nlp_profile,
+            nlp_vector_rows=args.nlp_vector_rows,
+            max_concurrent=args.max_concurrent,
+            queue_timeout=args.queue_timeout
+        )
\ No newline at end of file